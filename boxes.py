@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
 
 import argparse
+import concurrent.futures
 import csv
+import functools
+import itertools
 
 from collections import defaultdict
 from typing import Dict, List, Optional
@@ -58,37 +61,94 @@ POSTAMBLE = """  }
 POSTAMBLEDEBUG = """  }
 """
 
+# The SCAD calls made for each box and hole, with the format method
+# looked up once here rather than re-parsing a %-template per feature.
+# The box arguments are the position, the dimensions, and the colour
+# and label, which are fixed when the box is made (see scad_label):
+BOX_FORMAT = """    box({}, {}, {});\n""".format
+HOLE_FORMAT = """    hole([{:g}, {:g}, {:g}], [90, 0, {:g}], [{:g}, {:g}, hole_standback], {}, "{}");\n""".format
+
+# Directions in which a box is placed after the one it is adjacent
+# to, and before it, with the coordinate (X, Y, Z) each one moves along:
+DIRECTIONS_AFTER = {'right': 0, 'behind': 1, 'above': 2}
+DIRECTIONS_BEFORE = {'left': 0, 'front': 1, 'below': 2}
+
+# Walls at the far end of a room from its position, with the
+# coordinate (X, Y) they are along:
+FAR_WALLS = {'right': 0, 'back': 1}
+
+# Alignments making a box coterminous with the start or the end of the
+# one it is adjacent to, in X, Y, Z order:
+ALIGNMENTS_START = ('left', 'front', 'bottom')
+ALIGNMENTS_END = ('right', 'back', 'top')
+
+# The columns of the layout files that are used; any others are ignored.
 # The __init__ methods for all the things we read from the CSV files
-# each take the whole CSV row as their input.
+# each take the fields of a row in this order as their input (see
+# row_fields), and unpack the ones they use.
+COLUMNS = ('type', 'name', 'width', 'depth', 'height',
+           'adjacent', 'direction', 'alignment', 'offset', 'colour')
+
+def row_fields(row, indices):
+    """Pick the fields we use out of a spreadsheet row, in COLUMNS order.
+    indices gives the position of each of COLUMNS in the row, or None.
+    Columns missing from the header or the row are treated as empty."""
+    length = len(row)
+    return tuple('' if index is None or index >= length else row[index]
+                 for index in indices)
+
+def placement(direction, alignment):
+    """Resolve a box's direction and alignment into the axes they act on.
+    Return the axis along which the box follows the box it is adjacent
+    to, the axis along which it precedes it (each may be None), and
+    tuples of the axes on which it lines up with the start and with the
+    end of that box."""
+    alignment = alignment or ''
+    return (DIRECTIONS_AFTER.get(direction),
+            DIRECTIONS_BEFORE.get(direction),
+            tuple(index
+                  for index, edge in enumerate(ALIGNMENTS_START)
+                  if edge in alignment),
+            tuple(index
+                  for index, edge in enumerate(ALIGNMENTS_END)
+                  if edge in alignment))
+
+@functools.lru_cache(maxsize=256)
+def box_colour(name, opacity):
+    """Return the RGBA list for a colour name.
+    Layouts use a few colours many times over, so remember them; boxes
+    using the same colour share the list, so it must not be altered."""
+    return rgbcolour.rgbcolour(name, opacity)
+
+def scad_label(colour, name):
+    """Return the colour and label arguments of the SCAD call for a box.
+    These don't change once the box is made, so they are formatted then."""
+    return '%s, "%s"' % (('"%s"' % colour) if isinstance(colour, str) else colour,
+                         name)
 
 class Box:
 
     """A cuboid positive space, such as a room, box, or shelf and the space it supports.
     Not a hole such as a door or window."""
 
-    pass
+    __slots__ = ('box_type', 'name', 'dimensions', 'position', 'adjacent',
+                 'direction', 'alignment', 'offset', 'holes', 'colour', 'label',
+                 'axis_after', 'axis_before', 'aligned_start', 'aligned_end')
 
-    def __init__(self, data, definitions:dict):
-        self.box_type = data.get('type', 'room')
-        self.name = data['name']
-        self.dimensions = [float(data.get('width')),
-                           float(data.get('depth')),
-                           float(data.get('height'))]
+    def __init__(self, fields, definitions:dict):
+        (box_type, self.name, width, depth, height,
+         self.adjacent, self.direction, self.alignment, offset, colour) = fields
+        self.box_type = box_type or 'room'
+        self.dimensions = [float(width), float(depth), float(height)]
         self.position = [0.0, 0.0, 0.0]
-        self.adjacent = data.get('adjacent')
-        self.direction = data.get('direction')
-        self.alignment = data.get('alignment')
-        self.offset = data.get('offset', 0.0) or 0.0
+        (self.axis_after, self.axis_before,
+         self.aligned_start, self.aligned_end) = placement(self.direction, self.alignment)
+        self.offset = float(offset or 0.0)
         self.holes = []
-        self.neighbours = {'left': [],
-                           'right': [],
-                           'front': [],
-                           'behind': []}
-        self.colour = data.get('colour', [.5, .5, .5, .5])
-        if self.colour == "":
-            self.colour = [.5, .5, .5, .5]
-        if isinstance(self.colour, str):
-            self.colour = rgbcolour.rgbcolour(self.colour, definitions['opacity'].value)
+        self.colour = (box_colour(colour, definitions['opacity'].value)
+                       if colour
+                       else [.5, .5, .5, .5])
+        self.label = scad_label(self.colour, self.name)
 
     def __str__(self):
         return "<box %s of size %s at %s to %s of %s, %s-aligned>" % (
@@ -97,21 +157,16 @@ class Box:
             self.position,
             self.direction, self.adjacent, self.alignment)
 
-    def write_scad(self, stream):
-        """Write the SCAD code for this box.
-        Return a string describing the holes attached the box."""
-        stream.write("""    box(%s, %s, %s, "%s");\n""" % (
-            self.position,
-            self.dimensions,
-            ('"%s"' % self.colour) if isinstance(self.colour, str) else self.colour,
-            self.name))
-        return "".join(hole.scad_string(self)
-                       for hole in self.holes)
+    def write_scad(self, chunks, hole_chunks):
+        """Add the SCAD code for this box to chunks.
+        Add the SCAD code for the holes attached the box to hole_chunks."""
+        chunks.append(BOX_FORMAT(self.position, self.dimensions, self.label))
+        for hole in self.holes:
+            hole.write_scad(hole_chunks, self)
 
-def cell_as_float(row, name):
+def cell_as_float(value):
     """Convert the contents of a spreadsheet cell to a float.
     Empty cells are treated as 0.0"""
-    value = row.get(name)
     return 0 if value in (None, "") else float(value)
 
 class Hole:
@@ -119,23 +174,27 @@ class Hole:
     """A cuboid negative space to punch out of the wall of a box such as room.
     This represents doors and windows."""
 
-    pass
+    __slots__ = ('name', 'dimensions', 'adjacent', 'direction', 'height', 'offset',
+                 'far_wall', 'rotation')
 
-    def __init__(self, data, definitions):
-        self.name = data['name']
-        join = data['type'] == 'join'
+    def __init__(self, fields, definitions):
+        # the room that this hole is in one of the walls of, and which
+        # wall the hole is in (front, left, back, right):
+        (hole_type, self.name, width, depth, height,
+         self.adjacent, self.direction, _alignment, offset, _colour) = fields
+        join = hole_type == 'join'
         reduction = definitions['wall_thickness'].value if join else 0
-        self.dimensions = [float(data.get('width')) - reduction*2,# from one side of the hole to the other
-                           float(data.get('depth')) - reduction,  # from bottom to top of the hole
+        self.dimensions = [float(width) - reduction*2,# from one side of the hole to the other
+                           float(depth) - reduction,  # from bottom to top of the hole
                            definitions['hole_depth'].value]
-        # the room that this hole is in one of the walls of:
-        self.adjacent = data.get('adjacent')
-        # which wall the hole is in (front, left, back, right):
-        self.direction = data.get('direction')
         # from the floor to the bottom of the hole:
-        self.height = cell_as_float(data, 'height') + definitions['floor_thickness'].value*1.001
+        self.height = cell_as_float(height) + definitions['floor_thickness'].value*1.001
         # how far from the start of the wall the hole starts:
-        self.offset = cell_as_float(data, 'offset') + reduction
+        self.offset = cell_as_float(offset) + reduction
+        # the axis along which the wall is at the far side of the
+        # room, if it is, and the rotation to put the hole in the wall:
+        self.far_wall = FAR_WALLS.get(self.direction)
+        self.rotation = 90 if self.direction in ('left', 'right') else 0
 
     def __str__(self):
         return "<hole %s %g from start of %s of box %s>" % (self.name, self.offset, self.direction, self.adjacent)
@@ -143,29 +202,32 @@ class Hole:
     def scad_string(self, parent):
         """Return the SCAD code for this hole."""
         # hole(preshift, rot, postshift, dimensions, label)
-        return """    hole([%g, %g, %g], [90, 0, %g], [%g, %g, hole_standback], %s, "%s");\n""" % (
-            parent.position[0] + (parent.dimensions[0] if self.direction == 'right' else 0),
-            parent.position[1] + (parent.dimensions[1] if self.direction == 'back' else 0),
-            parent.position[2],
-            90 if self.direction in ('left', 'right') else 0,
+        x, y, z = parent.position
+        far_wall = self.far_wall
+        if far_wall == 0:
+            x += parent.dimensions[0]
+        elif far_wall == 1:
+            y += parent.dimensions[1]
+        return HOLE_FORMAT(
+            x, y, z,
+            self.rotation,
             self.offset, self.height,
             self.dimensions,
             self.name)
 
-    def write_scad(self, stream, parent):
-        """Write the SCAD code for this hole."""
-        stream.write(self.scad_string(parent))
+    def write_scad(self, chunks, parent):
+        """Add the SCAD code for this hole to chunks."""
+        chunks.append(self.scad_string(parent))
 
 class Constant:
 
     """A constant definition."""
 
-    pass
+    __slots__ = ('name', 'value')
 
-    def __init__(self, data, _definitions):
-        self.name = data['name']
-        self.value = data['width']
-        self.all_data = data
+    def __init__(self, fields, _definitions):
+        # the value is given in the width column:
+        _type, self.name, self.value = fields[:3]
 
     def __str__(self):
         return "<defined constant %s=%s>" % (self.name, self.value)
@@ -175,14 +237,11 @@ class Type:
     """A type definition.
     """
 
-    pass
+    __slots__ = ('name', 'dimensions')
 
-    def __init__(self, data, _definitions):
-        self.data = data
-        self.name = data['name']
-        self.dimensions = [float(data.get('width')),
-                           float(data.get('depth')),
-                           float(data.get('height'))]
+    def __init__(self, fields, _definitions):
+        _type, self.name, width, depth, height = fields[:5]
+        self.dimensions = [float(width), float(depth), float(height)]
         # Direct rows with this name in their type field to the implementation "Custom"
         makers[self.name] = makers['__custom__']
         print("Defined custom type", self.name)
@@ -197,93 +256,114 @@ class Custom:
 
     """
 
-    pass
+    __slots__ = ('box_type', 'name', 'dimensions', 'position', 'adjacent',
+                 'direction', 'alignment', 'colour', 'offset', 'label',
+                 'axis_after', 'axis_before', 'aligned_start', 'aligned_end')
 
-    def __init__(self, data, definitions):
-        self.box_type = data['type']
-        self.name = data['name']
+    def __init__(self, fields, definitions):
+        (self.box_type, self.name, _width, _depth, _height,
+         self.adjacent, self.direction, self.alignment, offset, colour) = fields
         self.dimensions = definitions[self.box_type].dimensions
         self.position = [0.0, 0.0, 0.0]
-        self.adjacent = data['adjacent']
-        self.direction = data.get('direction')
-        self.alignment = data.get('alignment')
-        self.colour = data.get('colour', [.5, .5, .5, .5])
-        if self.colour == "":
-            self.colour = [.5, .5, .5, .5]
-        self.offset = float(data.get('offset', 0.0) or 0.0)
-        self.data = data
+        (self.axis_after, self.axis_before,
+         self.aligned_start, self.aligned_end) = placement(self.direction, self.alignment)
+        self.colour = colour or [.5, .5, .5, .5]
+        self.offset = float(offset or 0.0)
+        self.label = scad_label(self.colour, self.name)
         print("Instantiating custom feature of type", self.box_type, "and dimensions", self.dimensions, "adjacent to", self.adjacent)
 
-    def write_scad(self, stream):
-        """Write the SCAD code for this custom feature instance."""
-        stream.write("""    box(%s, %s, %s, "%s");\n""" % (
-            self.position,
-            self.dimensions,
-            ('"%s"' % self.colour) if isinstance(self.colour, str) else self.colour,
-            self.name))
-        return ""
-
-# Define all the names for each of the functions to make an object
-# from a spreadsheet row (since there are multiple names for each
-# function, it is neater to write them this way, then invert the
-# table):
-names_for_makers = {
-    lambda row, definitions: Box(row, definitions): ('room', 'shelf', 'shelves', 'box'),
-    lambda row, definitions: Hole(row, definitions): ('door', 'window', 'join'),
-    lambda row, definitions: Constant(row, definitions): ('constant',),
-    lambda row, definitions: Type(row, definitions): ('type',),
-    lambda row, definitions: Custom(row, definitions): ('__custom__',)}
-
-# Invert the table, so we can look up row types in it:
-makers = {
-    name: maker
-    for maker, names in names_for_makers.items()
-    for name in names}
+    def write_scad(self, chunks, _hole_chunks):
+        """Add the SCAD code for this custom feature instance to chunks."""
+        chunks.append(BOX_FORMAT(self.position, self.dimensions, self.label))
 
-def position_dependents(definitions, dependents, box):
+# The class to make an object from a spreadsheet row, for each value
+# of the row's type field:
+makers = {
+    'room': Box,
+    'shelf': Box,
+    'shelves': Box,
+    'box': Box,
+    'door': Hole,
+    'window': Hole,
+    'join': Hole,
+    'constant': Constant,
+    'type': Type,
+    '__custom__': Custom}
+
+def place_dependent(box, dependent):
+    """Set the position of a box or custom feature from the box it is adjacent to."""
+    position = dependent.position
+    box_position = box.position
+    box_dimensions = box.dimensions
+
+    # neighbouring boxes that begin where the current one ends, or
+    # end where it begins:
+
+    index = dependent.axis_after
+    if index is not None:
+        position[index] = box_position[index] + box_dimensions[index]
+    else:
+        index = dependent.axis_before
+        if index is not None:
+            position[index] = box_position[index] - dependent.dimensions[index]
+
+    # neighbouring boxes that are coterminous with the current one:
+
+    for index in dependent.aligned_start:
+        position[index] = box_position[index] + dependent.offset
+
+    for index in dependent.aligned_end:
+        position[index] = (box_position[index]
+                           + box_dimensions[index]
+                           - dependent.dimensions[index]
+                           + dependent.offset)
+
+def place_children(dependents, box):
+    """Place the features that depend directly on a given box.
+    Return those features."""
+    children = dependents.get(box.name, ())
+    for dependent in children:
+        if isinstance(dependent, (Box, Custom)):
+            place_dependent(box, dependent)
+        elif isinstance(dependent, Hole):
+            box.holes.append(dependent)
+        else:
+            print("Other type:", dependent)
+    return children
+
+def position_subtree(dependents, box):
+    """Position everything below a box that has already been placed."""
+    # Walk the tree with an explicit stack rather than recursing, so
+    # deep layouts don't run into the recursion limit:
+    stack = [box]
+    while stack:
+        stack.extend(place_children(dependents, stack.pop()))
+
+def wall_thicknesses(definitions):
+    """Return the arguments adjust_dimensions needs after the feature.
+    These are the same for every room and hole, so work them out once."""
+    wall_thickness = definitions['wall_thickness'].value
+    return (wall_thickness,
+            definitions['floor_thickness'].value + definitions['ceiling_thickness'].value,
+            wall_thickness * 8) # hole depth, to make sure it gets through
+
+def position_dependents(dependents, box, jobs=1):
     """Position boxes dependent on a given box.
-    Then position their dependents, etc."""
-    if box.name in dependents:
-        for dependent_name in dependents[box.name]:
-            dependent = definitions[dependent_name]
-
-            if isinstance(dependent, (Box, Custom)):
-                # scan through the coordinates: X, Y, Z for
-                # neighbouring boxes that begin where the current one
-                # ends:
-
-                for index, direction in enumerate(['right', 'behind', 'above']):
-                    if dependent.direction == direction:
-                        dependent.position[index] = (box.position[index]
-                                                     + box.dimensions[index])
-
-                for index, direction in enumerate(['left', 'front', 'below']):
-                    if dependent.direction == direction:
-                        dependent.position[index] = (box.position[index]
-                                                     - dependent.dimensions[index])
-
-                # scan through the coordinates: X, Y, Z for
-                # neighbouring boxes that are coterminous with the
-                # current one:
-
-                for index, direction in enumerate(['left', 'front', 'bottom']):
-                    if direction in dependent.alignment:
-                        dependent.position[index] = (box.position[index]
-                                                     + dependent.offset)
-
-                for index, direction in enumerate(['right', 'back', 'top']):
-                    if direction in dependent.alignment:
-                        dependent.position[index] = (box.position[index]
-                                                     + box.dimensions[index]
-                                                     - dependent.dimensions[index]
-                                                     + dependent.offset)
-
-            elif isinstance(dependent, Hole):
-                box.holes.append(dependent)
-            else:
-                print("Other type:", dependent)
-
-            position_dependents(definitions, dependents, dependent)
+    Then position their dependents, etc.
+    With more than one job, the subtrees below the given box's own
+    dependents are positioned in that many threads."""
+    if jobs <= 1:
+        position_subtree(dependents, box)
+        return
+
+    # Positions only depend on the feature above, so once the given
+    # box's dependents are placed, the subtrees below them are
+    # independent of each other, and each box's holes are only
+    # added to by the thread handling that box:
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        for future in [executor.submit(position_subtree, dependents, child)
+                       for child in place_children(dependents, box)]:
+            future.result()
 
 DEFAULT_CONSTANTS = {
     'wall_thickness': 10,
@@ -294,7 +374,7 @@ DEFAULT_CONSTANTS = {
 
 def define_constant(definitions, name, value):
     """Add a constant to the definitions."""
-    definitions[name] = Constant({'name': name, 'width': value}, definitions)
+    definitions[name] = Constant(('constant', name, value), definitions)
 
 def add_default_constants(definitions):
     """Set constants if not loaded from file."""
@@ -304,52 +384,89 @@ def add_default_constants(definitions):
 
 def read_layout(filename:str, definitions:dict, limit=None):
     """Reads a file of layout data, returning a list of objects each made from a row."""
-    with open(filename) as instream:
-        return {row['name']: makers[row.get('type', 'room')](row, definitions)
-                for row in list(csv.DictReader(instream))[0:limit]}
-
-def adjust_dimensions(boxes):
-    """Add some dimensional details."""
-    wall_thickness = boxes['wall_thickness'].value
-    floor_thickness = boxes['floor_thickness'].value
-    ceiling_thickness = boxes['ceiling_thickness'].value
-
+    with open(filename, newline='') as instream:
+        reader = csv.reader(instream)
+        # Look up the positions of the columns we use once from the
+        # header, rather than making a dictionary for every row:
+        columns = {name: index
+                   for index, name in enumerate(next(reader, ()))
+                   if name in COLUMNS}
+        indices = tuple(columns.get(name) for name in COLUMNS)
+        rows = filter(None, reader)
+        # Stream the rows straight from the parser rather than
+        # building a list of every row just to slice it, except that
+        # a negative limit counts back from the end, so needs them all:
+        rows = (list(rows)[:limit]
+                if limit is not None and limit < 0
+                else itertools.islice(rows, limit))
+        return {fields[1]: makers[fields[0] or 'room'](fields, definitions)
+                for fields in (row_fields(row, indices) for row in rows)}
+
+def partition_features(definitions):
+    """Sort out the features of the layout from the other definitions.
+    Return lists of all the features and of the positive features,
+    each in the order they were defined."""
+    features = []
+    positives = []
+    for feature in definitions.values():
+        # nothing subclasses these, so an exact type test will do:
+        feature_type = type(feature)
+        if feature_type is Box or feature_type is Custom:
+            positives.append(feature)
+        elif feature_type is not Hole:
+            continue
+        features.append(feature)
+    return features, positives
+
+def adjust_dimensions(box, wall_thickness, vertical_thickness, hole_depth):
+    """Add some dimensional details to a feature."""
+    box_type = type(box)
     # The dimensions of rooms are presumed to be given as internal:
-    for box in boxes.values():
-        if isinstance(box, Box) and box.box_type == 'room':
-            box.dimensions[0] += wall_thickness # one half-thickness at each side
-            box.dimensions[1] += wall_thickness # one half-thickness at each end
-            box.dimensions[2] += floor_thickness + ceiling_thickness
-        elif isinstance(box, Hole):
-            box.dimensions[2] = wall_thickness * 8 # make sure it gets through
-    return PREAMBLE0 % (wall_thickness, floor_thickness, ceiling_thickness)
-
-def generate_tree(boxes):
-    """Work out the tree structure of what depends on what."""
+    if box_type is Box and box.box_type == 'room':
+        dimensions = box.dimensions
+        dimensions[0] += wall_thickness # one half-thickness at each side
+        dimensions[1] += wall_thickness # one half-thickness at each end
+        dimensions[2] += vertical_thickness
+    elif box_type is Hole:
+        box.dimensions[2] = hole_depth
+
+def make_preamble(definitions):
+    """Return the SCAD preamble, with the thicknesses filled in."""
+    return PREAMBLE0 % (definitions['wall_thickness'].value,
+                        definitions['floor_thickness'].value,
+                        definitions['ceiling_thickness'].value)
+
+def generate_tree(features):
+    """Work out the tree structure of what depends on what.
+    The result maps the name of each feature to the features that
+    depend on it, held directly so that walking the tree doesn't have
+    to look each of them up by name."""
     dependents = defaultdict(list)
     first_box = None
-    for box in boxes.values():
-        if isinstance(box, (Box, Hole, Custom)):
-            if box.adjacent == 'start':
-                if 'start' in dependents:
-                    print("There should be only one box dependent on 'start'.")
-                first_box = box
-            dependents[box.adjacent].append(box.name)
-    return dependents, first_box
+    for box in features:
+        if box.adjacent == 'start':
+            if 'start' in dependents:
+                print("There should be only one box dependent on 'start'.")
+            first_box = box
+        dependents[box.adjacent].append(box)
+    # The tree is only read from now on, so freeze it; this also stops
+    # lookups of leaf names adding empty entries to it:
+    return {name: tuple(children) for name, children in dependents.items()}, first_box
 
 def show_tree(dependents, start='start', depth=0):
     """Show a tree of dependents."""
     if start in dependents:
         for child in dependents[start]:
-            print("|   " * depth + child)
-            show_tree(dependents, child, depth+1)
+            print("|   " * depth + child.name)
+            show_tree(dependents, child.name, depth+1)
 
 def make_scad_layout(input_file_names:List[str],
                      output:str,
                      opacity:float = 1.0,
                      verbose:bool=False,
                      debug:bool=False,
-                     limit=None):
+                     limit=None,
+                     jobs:int=1):
     """Read layout definition files and produce a 3D model file from them."""
 
     definitions = {}
@@ -359,7 +476,9 @@ def make_scad_layout(input_file_names:List[str],
     for input_file_name in input_file_names:
         definitions.update(read_layout(input_file_name, limit=limit, definitions=definitions))
 
-    dependents, first_box = generate_tree(definitions)
+    features, positives = partition_features(definitions)
+
+    dependents, first_box = generate_tree(features)
 
     if verbose:
         show_tree(dependents)
@@ -367,22 +486,35 @@ def make_scad_layout(input_file_names:List[str],
     if 'start' not in dependents:
         print("No starting point given")
 
-    sized_preamble = adjust_dimensions(definitions)
+    sized_preamble = make_preamble(definitions)
+
+    # This is done for every feature before the tree is walked, rather
+    # than as each one is reached, because features the walk doesn't
+    # reach are still drawn:
+    thicknesses = wall_thicknesses(definitions)
+    for feature in features:
+        adjust_dimensions(feature, *thicknesses)
 
     # Now process the tree
     first_box.position = [0.0, 0.0, 0.0]
-    position_dependents(definitions, dependents, first_box)
-
-    with open(output, 'w') as outstream:
-        outstream.write("""// Produced from %s\n""" % input_file_name)
-        outstream.write(sized_preamble)
-        outstream.write(PREAMBLE1DEBUG if debug else PREAMBLE1)
-        holes = "".join(box.write_scad(outstream)
-                        for box in definitions.values()
-                        if isinstance(box, (Box, Custom)))
-        outstream.write(INTERAMBLEDEBUG if debug else INTERAMBLE)
-        outstream.write(holes)
-        outstream.write(POSTAMBLEDEBUG if debug else POSTAMBLE)
+    position_dependents(dependents, first_box, jobs)
+
+    # Build up the whole output as a list of strings, and write it in
+    # one go at the end:
+    chunks = ["""// Produced from %s\n""" % input_file_name,
+              sized_preamble,
+              PREAMBLE1DEBUG if debug else PREAMBLE1]
+    # The holes go in a separate union after all the boxes, so
+    # collect them as we go:
+    hole_chunks = []
+    for box in positives:
+        box.write_scad(chunks, hole_chunks)
+    chunks.append(INTERAMBLEDEBUG if debug else INTERAMBLE)
+    chunks.extend(hole_chunks)
+    chunks.append(POSTAMBLEDEBUG if debug else POSTAMBLE)
+
+    with open(output, 'w', buffering=1<<20) as outstream:
+        outstream.writelines(chunks)
 
 def get_args():
     """Get the command line args."""
@@ -401,6 +533,9 @@ def get_args():
     parser.add_argument("--limit", "-l",
                         type=int,
                         help="""Use only this many rows of the input, for incremental debugging.""")
+    parser.add_argument("--jobs", "-j",
+                        type=int, default=1,
+                        help="""Position independent parts of the layout in this many threads (worthwhile on free-threaded Python builds).""")
     parser.add_argument("input_file_names",
                         nargs='+',
                         help="""A CSV file with fields as described in the accompanying README.md file.""")